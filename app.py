@@ -1,9 +1,15 @@
 from flask import Flask, request, jsonify
 import re
 import os
+import json
+from functools import lru_cache
+import ahocorasick
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 
 app = Flask(__name__)
+# Ingredient lists are a few KB; refuse anything far larger outright
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024
 CORS(app)
 
 # Sample list of gluten-containing ingredients
@@ -48,97 +54,188 @@ AMBIGUOUS_INGREDIENTS = [
     {"name": "vegetable protein", "reason": "Source may include wheat", "confidence": 0.5},
 ]
 
-@app.route('/', methods=['GET'])
-def home():
-    return jsonify({"message": "Gluten Free Scanner API is running. Use /analyze endpoint for ingredient analysis."})
+def _build_ingredient_automaton():
+    """Index every ingredient name in one automaton so a single scan finds all of them"""
+    automaton = ahocorasick.Automaton()
+    for index, ingredient in enumerate(GLUTEN_INGREDIENTS):
+        automaton.add_word(ingredient["name"], ("gluten", index, len(ingredient["name"])))
+    for index, ingredient in enumerate(AMBIGUOUS_INGREDIENTS):
+        automaton.add_word(ingredient["name"], ("ambiguous", index, len(ingredient["name"])))
+    for safe_flour in SAFE_FLOURS:
+        automaton.add_word(safe_flour, ("safe_flour", None, len(safe_flour)))
+    automaton.make_automaton()
+    return automaton
 
-@app.route('/analyze', methods=['POST'])
-def analyze_ingredients():
-    data = request.json
-    if not data or 'ingredients_text' not in data:
-        return jsonify({"error": "Missing ingredients_text parameter"}), 400
-    
-    # Normalize text: lowercase and remove extra spaces between letters (for OCR issues)
-    raw_text = data['ingredients_text'].lower()
+INGREDIENT_AUTOMATON = _build_ingredient_automaton()
+
+# Matches are tracked as list indexes; these answer the per-request
+# questions with set operations instead of dict lookups
+FLOUR_INDEX = next(index for index, ingredient in enumerate(GLUTEN_INGREDIENTS) if ingredient["name"] == "flour")
+LIKELY_GLUTEN_INDEXES = frozenset(
+    index for index, ingredient in enumerate(GLUTEN_INGREDIENTS) if ingredient["confidence"] > 0.7
+)
+LIKELY_AMBIGUOUS_INDEXES = frozenset(
+    index for index, ingredient in enumerate(AMBIGUOUS_INGREDIENTS) if ingredient["confidence"] > 0.7
+)
+
+# Text is lowercased before matching, so none of these need re.IGNORECASE
+# A "contains:" statement names a gluten grain anywhere later on its line
+CONTAINS_HEAD_RE = re.compile(r'contains\s*:')
+GLUTEN_TERM_RE = re.compile(r'wheat|barley|rye|gluten')
+GLUTEN_FREE_RE = re.compile(r'gluten[\s-]*free')
+# OCR often spaces out letters of short words ("w h e a t"); joins runs of
+# two or three single letters, preferring three, in one pass over the text
+SPACED_LETTERS_RE = re.compile(r'\b([a-z]) ([a-z])(?: ([a-z]))?([ ,.])')
+
+# Bodies for the results that never vary, serialized once at import
+CONTAINS_STATEMENT_BODY = json.dumps({
+    "is_gluten_free": False,
+    "message": "Product explicitly states it contains gluten ingredients.",
+    "flagged_ingredients": [{"name": "Allergen statement", "reason": "Contains gluten (see 'contains' statement)", "confidence": 1.0}]
+})
+GLUTEN_FREE_LABEL_BODY = json.dumps({
+    "is_gluten_free": True,
+    "message": "Product is labeled as gluten-free.",
+    "flagged_ingredients": []
+})
+NO_GLUTEN_FOUND_BODY = json.dumps({
+    "is_gluten_free": True,
+    "message": "No gluten-containing ingredients detected.",
+    "flagged_ingredients": []
+})
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+def _has_contains_statement(text):
+    """Check for "contains: ... wheat"-style statements, searching each line only once"""
+    searched_until = -1
+    for head in CONTAINS_HEAD_RE.finditer(text):
+        # A later "contains:" on an already searched line only covers a
+        # suffix of what was searched, so it can't find anything new
+        if head.end() <= searched_until:
+            continue
+        line_end = text.find('\n', head.end())
+        if line_end == -1:
+            line_end = len(text)
+        if GLUTEN_TERM_RE.search(text, head.end(), line_end):
+            return True
+        searched_until = line_end
+    return False
+
+def _find_label_statement(texts):
+    """Return "contains" or "gluten_free" for the label statement that decides texts, or None"""
+    statement = None
+    for text in texts:
+        # Every statement contains one of these literals; str's substring
+        # search rules out most ingredient lists without entering the regex
+        if "contains" in text and _has_contains_statement(text):
+            # A contains statement always wins, so there's no need to keep scanning
+            return "contains"
+        if statement is None and "gluten" in text and GLUTEN_FREE_RE.search(text):
+            statement = "gluten_free"
+    return statement
+
+def _scan_ingredients(text, gluten_hits, ambiguous_hits):
+    """Record every ingredient matched in text; returns True if a safe flour was seen"""
+    safe_flour_present = False
+    for end, (kind, index, length) in INGREDIENT_AUTOMATON.iter(text):
+        # Safe flours are plain substring matches, everything else needs word boundaries
+        if kind == "safe_flour":
+            safe_flour_present = True
+            continue
+        start = end - length + 1
+        if start > 0 and _is_word_char(text[start - 1]):
+            continue
+        if end + 1 < len(text) and _is_word_char(text[end + 1]):
+            continue
+        if kind == "gluten":
+            gluten_hits.add(index)
+        else:
+            ambiguous_hits.add(index)
+    return safe_flour_present
+
+def _analyze_text(raw_text):
+    """Analyze lowercased ingredient text into a JSON body"""
     ingredients_text = raw_text
     # Also create a version with spaces removed between single letters (helps with OCR issues)
-    normalized_text = re.sub(r'\b([a-z]) ([a-z]) ([a-z])([ ,.])', r'\1\2\3\4', raw_text)
-    normalized_text = re.sub(r'\b([a-z]) ([a-z])([ ,.])', r'\1\2\3', normalized_text)
+    normalized_text = SPACED_LETTERS_RE.sub(lambda match: ''.join(filter(None, match.groups())), raw_text)
+    # Most text has no spaced-out letters; don't scan the same string twice
+    if normalized_text == ingredients_text:
+        texts = (ingredients_text,)
+    else:
+        texts = (ingredients_text, normalized_text)
     
     # Check for explicitly labeled info in either version
-    contains_pattern = r'contains\s*:.*?(wheat|barley|rye|gluten)'
-    if re.search(contains_pattern, ingredients_text, re.IGNORECASE) or re.search(contains_pattern, normalized_text, re.IGNORECASE):
-        return jsonify({
-            "is_gluten_free": False,
-            "message": "Product explicitly states it contains gluten ingredients.",
-            "flagged_ingredients": [{"name": "Allergen statement", "reason": "Contains gluten (see 'contains' statement)", "confidence": 1.0}]
-        })
+    statement = _find_label_statement(texts)
+    if statement == "contains":
+        return CONTAINS_STATEMENT_BODY
     
-    gluten_free_pattern = r'gluten[\s-]*free'
-    if re.search(gluten_free_pattern, ingredients_text, re.IGNORECASE) or re.search(gluten_free_pattern, normalized_text, re.IGNORECASE):
-        return jsonify({
-            "is_gluten_free": True,
-            "message": "Product is labeled as gluten-free.",
-            "flagged_ingredients": []
-        })
-    
-    # Check for ingredients
-    flagged = []
-    
-    # Split text into words/phrases for more accurate matching
-    words = re.split(r'[,;\n\(\)]', ingredients_text)
-    words = [w.strip() for w in words]
-    
-    # Also create normalized words list for OCR issues
-    normalized_words = re.split(r'[,;\n\(\)]', normalized_text)
-    normalized_words = [w.strip() for w in normalized_words]
+    if statement == "gluten_free":
+        return GLUTEN_FREE_LABEL_BODY
     
-    # First check if any safe flours are present
-    safe_flour_present = False
-    for safe_flour in SAFE_FLOURS:
-        if any(safe_flour in word for word in words) or any(safe_flour in word for word in normalized_words):
-            safe_flour_present = True
-            break
+    # Check for ingredients in both original and normalized text in a single scan;
+    # no ingredient name spans a newline, so joining can't create false matches
+    gluten_hits = set()
+    ambiguous_hits = set()
+    safe_flour_present = _scan_ingredients("\n".join(texts), gluten_hits, ambiguous_hits)
     
-    # Match against known gluten ingredients
-    for ingredient in GLUTEN_INGREDIENTS:
-        ingredient_name = ingredient["name"]
-        
-        # Skip "flour" check if we found a safe flour
-        if ingredient_name == "flour" and safe_flour_present:
-            continue
-            
-        # Check in both original and normalized text
-        if any(re.search(r'\b' + re.escape(ingredient_name) + r'\b', word) for word in words) or \
-           any(re.search(r'\b' + re.escape(ingredient_name) + r'\b', word) for word in normalized_words):
-            flagged.append(ingredient)
+    # Match against known gluten ingredients, skipping "flour" if we found a safe flour
+    if safe_flour_present:
+        gluten_hits.discard(FLOUR_INDEX)
     
-    # Match against ambiguous ingredients only if no definite matches
-    if not flagged:
-        for ingredient in AMBIGUOUS_INGREDIENTS:
-            if any(re.search(r'\b' + re.escape(ingredient["name"]) + r'\b', word) for word in words) or \
-               any(re.search(r'\b' + re.escape(ingredient["name"]) + r'\b', word) for word in normalized_words):
-                flagged.append(ingredient)
+    if gluten_hits:
+        hits, ingredients, likely_indexes = gluten_hits, GLUTEN_INGREDIENTS, LIKELY_GLUTEN_INDEXES
+    else:
+        # Match against ambiguous ingredients only if no definite matches
+        hits, ingredients, likely_indexes = ambiguous_hits, AMBIGUOUS_INGREDIENTS, LIKELY_AMBIGUOUS_INDEXES
     
     # Determine if product is gluten-free
-    if not flagged:
-        return jsonify({
-            "is_gluten_free": True,
-            "message": "No gluten-containing ingredients detected.",
-            "flagged_ingredients": []
-        })
-    elif any(item["confidence"] > 0.7 for item in flagged):
-        return jsonify({
+    if not hits:
+        return NO_GLUTEN_FOUND_BODY
+    
+    flagged = [ingredients[index] for index in sorted(hits)]
+    if not likely_indexes.isdisjoint(hits):
+        return json.dumps({
             "is_gluten_free": False,
             "message": "This product contains ingredients that likely have gluten.",
             "flagged_ingredients": flagged
         })
     else:
-        return jsonify({
+        return json.dumps({
             "is_gluten_free": False,
             "message": "This product contains ingredients that may have gluten. Caution is advised.",
             "flagged_ingredients": flagged
         })
 
+# The result depends only on the text, so repeat scans of a label are cached.
+# Longer texts bypass the cache so it can't pin large payloads in memory
+MAX_CACHED_TEXT_LENGTH = 8192
+_analyze_text_cached = lru_cache(maxsize=1024)(_analyze_text)
+
+@app.route('/', methods=['GET'])
+def home():
+    return jsonify({"message": "Gluten Free Scanner API is running. Use /analyze endpoint for ingredient analysis."})
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({"error": "ingredients_text is too large"}), 413
+
+@app.route('/analyze', methods=['POST'])
+def analyze_ingredients():
+    data = request.json
+    if not data or 'ingredients_text' not in data:
+        return jsonify({"error": "Missing ingredients_text parameter"}), 400
+    
+    # Normalize case here so differently-cased copies of a label share a cache entry
+    raw_text = data['ingredients_text'].lower()
+    if len(raw_text) <= MAX_CACHED_TEXT_LENGTH:
+        body = _analyze_text_cached(raw_text)
+    else:
+        body = _analyze_text(raw_text)
+    
+    # A fresh response per request, since after_request hooks (CORS) modify it
+    return app.response_class(body, mimetype='application/json')
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
@@ -0,0 +1,16 @@
+# Production server settings for the ingredient analysis API, picked up
+# automatically by running `gunicorn app:app` from this directory
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+# One worker process per core so requests are analyzed in parallel,
+# plus a couple of threads each to overlap request I/O
+workers = multiprocessing.cpu_count()
+worker_class = 'gthread'
+threads = 2
+
+# Import the app once in the master and fork workers from it, so the
+# ingredient automaton and regexes are built a single time per deployment
+preload_app = True
@@ -1,5 +1,6 @@
 from flask import Flask, request, jsonify, render_template, send_from_directory
-from ocr_handler import process_image
+from werkzeug.exceptions import RequestEntityTooLarge
+from ocr_handler import process_image, process_image_bytes
 import os
 import logging
 
@@ -15,6 +16,17 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# Cap uploads well above a phone photo of a label
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+
+def _ocr_response(result):
+    """Turn an OCR result into a JSON response with the matching status code"""
+    if result['success']:
+        logger.info("OCR processing successful")
+        return jsonify(result)
+    else:
+        logger.error(f"OCR processing failed: {result.get('error', 'Unknown error')}")
+        return jsonify(result), 500
 
 @app.route('/api/ocr', methods=['POST'])
 def ocr_endpoint():
@@ -33,19 +45,42 @@ def ocr_endpoint():
             
         # Process the image with OCR
         logger.info("Received OCR request, processing...")
-        result = process_image(base64_image)
+        return _ocr_response(process_image(base64_image))
         
-        if result['success']:
-            logger.info("OCR processing successful")
-            return jsonify(result)
-        else:
-            logger.error(f"OCR processing failed: {result.get('error', 'Unknown error')}")
-            return jsonify(result), 500
+    except RequestEntityTooLarge:
+        # Let the 413 handler below answer instead of reporting a server error
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in OCR endpoint: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/ocr-binary', methods=['POST'])
+def ocr_binary_endpoint():
+    """OCR endpoint taking the raw image file as the request body, skipping base64"""
+    try:
+        image_bytes = request.get_data()
         
+        if not image_bytes:
+            logger.warning("No image in request body")
+            return jsonify({'success': False, 'error': 'No image provided'}), 400
+            
+        # Process the image with OCR
+        logger.info("Received binary OCR request, processing...")
+        return _ocr_response(process_image_bytes(image_bytes))
+        
+    except RequestEntityTooLarge:
+        # Let the 413 handler below answer instead of reporting a server error
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in OCR endpoint: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Report oversized uploads in the same JSON shape as other OCR errors"""
+    logger.warning("Rejected upload over MAX_CONTENT_LENGTH")
+    return jsonify({'success': False, 'error': 'Image too large'}), 413
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint"""
@@ -0,0 +1,21 @@
+# Production server settings for the OCR server, picked up automatically
+# by running `gunicorn app:app` from this directory
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# One worker process per core so OCR requests run in parallel; Tesseract
+# runs as a subprocess, so extra threads keep each worker busy meanwhile
+workers = multiprocessing.cpu_count()
+worker_class = 'gthread'
+threads = 2
+
+# Import the app once in the master and fork workers from it, so OpenCV,
+# NumPy and Pillow load a single time instead of once per worker boot
+preload_app = True
+
+# Parallelism comes from the worker processes above, so keep each Tesseract
+# run single-threaded; its default OpenMP threading oversubscribes the CPU
+# as soon as several OCR requests run at once
+raw_env = ['OMP_THREAD_LIMIT=1']
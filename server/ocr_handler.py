@@ -2,81 +2,168 @@ import base64
 import pytesseract
 import cv2
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 import io
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_image(base64_image):
-    """Process an image with OCR and return the extracted text"""
+# Recent OCR results keyed by a digest of the image bytes, so retries and
+# repeat scans of the same label skip decoding and Tesseract entirely
+OCR_CACHE_SIZE = 256
+_ocr_cache = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+# Largest image side passed to Tesseract; matches the client-side limit in
+# static/js/server-ocr.js, bigger uploads only cost recognition time
+MAX_OCR_DIMENSION = 1200
+
+# Tesseract configuration tuned for ingredient lists
+# --psm 6: Assume a single uniform block of text
+# --oem 1: Use only the LSTM neural network engine
+# The whitelist keeps recognition to characters that appear in ingredient lists.
+# It is ASCII only, so non-ASCII letters are forced to their nearest ASCII
+# match ("purée" reads as "puree"), and '|' can no longer be produced at all
+TESSERACT_CONFIG = (
+    '--psm 6 --oem 1 -c preserve_interword_spaces=1 '
+    '-c "tessedit_char_whitelist='
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+    ",.:;()[]/%&'*-\""
+)
+
+# Longest data URL header searched for, e.g. "data:image/jpeg;base64,"
+MAX_DATA_URL_HEADER = 256
+
+def _ocr_image_bytes(image_bytes):
+    """Run the preprocessing pipeline and Tesseract on decoded image bytes"""
+    # Decode straight to 8-bit grayscale; Tesseract doesn't need color.
+    # draft() lets the JPEG decoder emit luminance only, and
+    # exif_transpose keeps the orientation handling cv2.imdecode had
+    try:
+        pil_img = Image.open(io.BytesIO(image_bytes))
+        if pil_img.mode.startswith('I'):
+            # 16-bit grayscale (modes I, I;16...); convert('L') would clip
+            # everything above 255 to white, so scale down like cv2.imdecode
+            pixels = np.asarray(ImageOps.exif_transpose(pil_img))
+            pil_gray = Image.fromarray(np.clip(pixels >> 8, 0, 255).astype(np.uint8))
+        else:
+            pil_img.draft('L', pil_img.size)
+            pil_gray = ImageOps.exif_transpose(pil_img.convert('L'))
+    except OSError:
+        pil_gray = None
+    
+    if pil_gray is None or pil_gray.width == 0 or pil_gray.height == 0:
+        logger.error("Failed to decode image")
+        return {
+            'success': False,
+            'error': 'Invalid image data'
+        }
+        
+    # Get image dimensions for logging
+    width, height = pil_gray.size
+    logger.info(f"Processing image: {width}x{height} pixels")
+    
+    # Image preprocessing pipeline for text extraction
+    # 1. Get a writable grayscale array for OpenCV
+    gray = np.array(pil_gray)
+    
+    # Downscale oversized images; Tesseract's work grows with pixel count
+    if max(width, height) > MAX_OCR_DIMENSION:
+        scale = MAX_OCR_DIMENSION / max(width, height)
+        # Explicit size so the short side of very elongated images can't round to 0
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        gray = cv2.resize(gray, new_size, interpolation=cv2.INTER_AREA)
+    
+    # 2. Apply adaptive thresholding
+    # This is often better for varying lighting conditions
+    # Written back into the grayscale buffer to avoid another full-size array
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY, 11, 2, dst=gray
+    )
+    
+    # 3. Remove speckle noise left by thresholding
+    # A 3x3 median is enough on a binary image; no contrast step is
+    # needed since the pixels are already pure black or white
+    cv2.medianBlur(binary, 3, dst=binary)
+    
+    # Convert processed image back to PIL format for tesseract
+    pil_img = Image.fromarray(binary)
+    
+    # Perform OCR with optimized configuration for ingredient lists
+    text = pytesseract.image_to_string(
+        pil_img, 
+        lang='eng',
+        config=TESSERACT_CONFIG
+    )
+    
+    # Post-processing of the text
+    processed_text = text.strip().replace('l', 'I')  # Often confused
+    
+    logger.info("OCR processing completed successfully")
+    return {
+        'success': True,
+        'text': processed_text,
+        'confidence': 90  # Static confidence value
+    }
+
+def process_image_bytes(image_bytes):
+    """Process raw image bytes with OCR and return the extracted text"""
     try:
         logger.info("Processing OCR request")
         
-        # Remove data:image/jpeg;base64, prefix if present
-        if 'base64,' in base64_image:
-            base64_image = base64_image.split('base64,')[1]
-            
-        # Decode the base64 image
-        image_bytes = base64.b64decode(base64_image)
+        # Serve repeat images from the cache
+        digest = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        with _ocr_cache_lock:
+            cached = _ocr_cache.get(digest)
+            if cached is not None:
+                _ocr_cache.move_to_end(digest)
+        if cached is not None:
+            logger.info("OCR result served from cache")
+            return dict(cached)
+        
+        result = _ocr_image_bytes(image_bytes)
         
-        # Convert to OpenCV format for processing
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Only successful results are cached so bad uploads can be retried
+        if result['success']:
+            with _ocr_cache_lock:
+                _ocr_cache[digest] = result
+                if len(_ocr_cache) > OCR_CACHE_SIZE:
+                    _ocr_cache.popitem(last=False)
+        return dict(result)
         
-        if img is None or img.size == 0:
-            logger.error("Failed to decode image")
+    except Exception as e:
+        logger.error(f"OCR processing error: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def process_image(base64_image):
+    """Process a base64 image (optionally a data URL) with OCR and return the extracted text"""
+    try:
+        base64_image = base64_image.strip()
+        
+        # Remove data:image/jpeg;base64, prefix if present. The header is
+        # short and ends at the first comma, which base64 never contains,
+        # so only the start of the string needs searching
+        comma = base64_image.find(',', 0, MAX_DATA_URL_HEADER)
+        if comma != -1:
+            base64_image = base64_image[comma + 1:]
+        elif base64_image.startswith('data:'):
+            logger.error("Malformed data URL")
             return {
                 'success': False,
-                'error': 'Invalid image data'
+                'error': 'Malformed data URL: missing comma after header'
             }
             
-        # Get image dimensions for logging
-        height, width = img.shape[:2]
-        logger.info(f"Processing image: {width}x{height} pixels")
-        
-        # Image preprocessing pipeline for text extraction
-        # 1. Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # 2. Apply adaptive thresholding
-        # This is often better for varying lighting conditions
-        binary = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY, 11, 2
-        )
-        
-        # 3. Denoise the image (can help with text clarity)
-        denoised = cv2.fastNlMeansDenoising(binary, None, 10, 7, 21)
-        
-        # 4. Increase contrast
-        enhanced = cv2.convertScaleAbs(denoised, alpha=1.2, beta=0)
-        
-        # Convert processed image back to PIL format for tesseract
-        pil_img = Image.fromarray(enhanced)
-        
-        # Perform OCR with optimized configuration for ingredient lists
-        # --psm 6: Assume a single uniform block of text
-        # --oem 3: Use LSTM neural network mode
-        text = pytesseract.image_to_string(
-            pil_img, 
-            lang='eng',
-            config='--psm 6 --oem 3 -c preserve_interword_spaces=1'
-        )
-        
-        # Post-processing of the text
-        processed_text = text.strip()
-        processed_text = processed_text.replace('|', 'I')  # Common misrecognition
-        processed_text = processed_text.replace('l', 'I')  # Often confused
-        
-        logger.info("OCR processing completed successfully")
-        return {
-            'success': True,
-            'text': processed_text,
-            'confidence': 90  # Static confidence value
-        }
+        # Decode the base64 image
+        image_bytes = base64.b64decode(base64_image)
         
     except Exception as e:
         logger.error(f"OCR processing error: {str(e)}")
@@ -84,3 +171,5 @@ def process_image(base64_image):
             'success': False,
             'error': str(e)
         }
+    
+    return process_image_bytes(image_bytes)
@@ -33,18 +33,24 @@ async function performServerOCR(imageElement) {
         const ctx = canvas.getContext('2d');
         ctx.drawImage(imageElement, 0, 0, imgWidth, imgHeight);
         
-        // Get base64 image with reduced quality for faster upload
-        const base64Image = canvas.toDataURL('image/jpeg', 0.7);
+        // Get JPEG image with reduced quality for faster upload
+        const imageBlob = await new Promise((resolve, reject) => {
+            canvas.toBlob(
+                blob => blob ? resolve(blob) : reject(new Error('Could not encode image')),
+                'image/jpeg',
+                0.7
+            );
+        });
         
         console.log(`Image prepared for server upload: ${imgWidth}x${imgHeight}`);
         
-        // Send to server
-        const response = await fetch('/api/ocr', {
+        // Send the raw JPEG to the server (no base64 encoding overhead)
+        const response = await fetch('/api/ocr-binary', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json',
+                'Content-Type': 'image/jpeg',
             },
-            body: JSON.stringify({ image: base64Image }),
+            body: imageBlob,
         });
         
         // Parse result